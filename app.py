@@ -1,23 +1,68 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 import uuid
-import json
+import orjson
 import qrcode
 import io
-import base64
 import mercadopago
+from mercadopago.http import HttpClient
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import sqlite3
 from datetime import datetime, timedelta, timezone
 import threading
 import time
+import queue
+import operator
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import tempfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+import atexit
+import logging
+import logging.handlers
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Configuração de logs (a escrita no stream é feita por uma thread separada)
+logger = logging.getLogger('qi')
+_log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+if _log_level not in logging.getLevelNamesMapping():
+    _log_level = 'INFO'
+logger.setLevel(_log_level)
+logger.propagate = False
+
+_log_queue = queue.Queue(-1)
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Provider JSON do Flask usando orjson (jsonify e request.get_json)"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
 CORS(app)
 
@@ -25,10 +70,10 @@ CORS(app)
 if os.getenv('RENDER'):
     # No Render, usar diretório temporário
     DB_PATH = os.path.join(tempfile.gettempdir(), 'qi_test.db')
-    print(f"🔧 Ambiente Render detectado - DB Path: {DB_PATH}")
+    logger.info("🔧 Ambiente Render detectado - DB Path: %s", DB_PATH)
 else:
     DB_PATH = 'qi_test.db'
-    print(f"🔧 Ambiente local - DB Path: {DB_PATH}")
+    logger.info("🔧 Ambiente local - DB Path: %s", DB_PATH)
 
 # Configurações do Mercado Pago (PRODUÇÃO)
 MP_ACCESS_TOKEN = os.getenv('MP_ACCESS_TOKEN')
@@ -36,18 +81,135 @@ if not MP_ACCESS_TOKEN:
     raise ValueError("MP_ACCESS_TOKEN não encontrado no arquivo .env")
 
 if MP_ACCESS_TOKEN.startswith('TEST-'):
-    print("⚠️  AVISO: Usando token de TESTE. Para produção, use token de PRODUÇÃO!")
+    logger.warning("⚠️  AVISO: Usando token de TESTE. Para produção, use token de PRODUÇÃO!")
+
+# Threads que chamam o Mercado Pago em segundo plano (também dimensiona o pool HTTP)
+PAYMENT_WORKERS = 32
+
+class KeepAliveHttpClient(HttpClient):
+    """Cliente HTTP do SDK do Mercado Pago reaproveitando conexões (keep-alive)"""
+
+    def __init__(self, pool_maxsize):
+        # O cliente padrão do SDK abre uma Session (e um handshake TLS) por chamada
+        self._pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _get_session(self, maxretries):
+        # Uma Session por política de retry (na prática, só o max_retries do RequestOptions)
+        with self._lock:
+            session = self._sessions.get(maxretries)
+            if session is None:
+                retry_strategy = Retry(
+                    total=maxretries,
+                    status_forcelist=[429, 500, 502, 503, 504]
+                )
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=10,
+                                                      pool_maxsize=self._pool_maxsize,
+                                                      max_retries=retry_strategy))
+                self._sessions[maxretries] = session
+            return session
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        api_result = self._get_session(maxretries).request(method, url, **kwargs)
+        return {
+            "status": api_result.status_code,
+            "response": api_result.json()
+        }
 
-sdk = mercadopago.SDK(MP_ACCESS_TOKEN)
+sdk = mercadopago.SDK(MP_ACCESS_TOKEN, http_client=KeepAliveHttpClient(PAYMENT_WORKERS))
+
+# Respostas corretas (as mesmas do frontend)
+CORRECT_ANSWERS = (1, 2, 3, 1, 4, 3, 2, 0, 1, 1, 1, 1, 1, 2, 2,
+                   4, 2, 1, 1, 1, 0, 0, 3, 1, 1, 1, 1, 3, 0, 0)
+
+def calculate_iq(correct_count):
+    """Calcula o QI e o nível a partir do número de acertos"""
+    percentage = (correct_count / 30) * 100
+
+    # Calcular QI (fórmula refinada para produção)
+    if percentage >= 95:
+        iq_score = int(145 + (percentage - 95) * 2)
+    elif percentage >= 85:
+        iq_score = int(130 + (percentage - 85) * 1.5)
+    elif percentage >= 70:
+        iq_score = int(115 + (percentage - 70) * 1)
+    elif percentage >= 50:
+        iq_score = int(100 + (percentage - 50) * 0.75)
+    elif percentage >= 30:
+        iq_score = int(85 + (percentage - 30) * 0.75)
+    else:
+        iq_score = int(70 + percentage * 0.5)
+
+    # Limitar QI entre 50 e 200
+    iq_score = max(50, min(200, iq_score))
+
+    # Determinar nível
+    if iq_score >= 140:
+        level = "Gênio"
+    elif iq_score >= 130:
+        level = "Superdotado"
+    elif iq_score >= 115:
+        level = "Acima da Média"
+    elif iq_score >= 85:
+        level = "Média"
+    else:
+        level = "Abaixo da Média"
+
+    return iq_score, level
+
+# Tabela de QI/nível para cada número de acertos possível (0 a 30)
+_IQ_TABLE = tuple(calculate_iq(c) for c in range(31))
+
+def dig(d, *keys, default=None):
+    """Busca um valor em dicionários aninhados sem criar dicionários vazios"""
+    for key in keys:
+        if not isinstance(d, dict):
+            return default
+        d = d.get(key)
+    return default if d is None else d
+
+def decode_answers(value):
+    """Converte as respostas salvas (1 byte por resposta) de volta para lista"""
+    if not value:
+        return []
+    # Registros antigos foram salvos como JSON
+    if isinstance(value, str):
+        return orjson.loads(value)
+    return list(value)
+
+# Tamanho do pool de conexões de leitura
+READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 6))
+
+# Máximo de linhas removidas por transação na limpeza
+CLEANUP_BATCH_SIZE = 500
+
+# Intervalo entre execuções da limpeza (padrão: 1 hora)
+CLEANUP_INTERVAL_SEC = int(os.getenv('CLEANUP_INTERVAL_SEC', 3600))
+
+# Máximo de testes consultados por chamada ao /batch
+BATCH_MAX_UUIDS = 100
+
+# Gravação em lote dos logs de webhook
+WEBHOOK_LOG_BATCH_SIZE = 32
+WEBHOOK_LOG_FLUSH_SEC = 0.05
+WEBHOOK_LOG_QUEUE_SIZE = 1024
 
 def get_db_connection():
     """Função para obter conexão com o banco de dados"""
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=30.0)
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA journal_mode=WAL")  # Melhor performance
+        conn.execute("PRAGMA synchronous=NORMAL")  # Seguro com WAL, menos fsyncs
+        conn.execute("PRAGMA busy_timeout=5000")  # Espera pelo lock dentro do SQLite
+        conn.execute("PRAGMA cache_size=-64000")  # Cache de páginas de 64MB
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256MB
         return conn
     except Exception as e:
-        print(f"❌ Erro ao conectar ao banco: {e}")
+        logger.error("❌ Erro ao conectar ao banco: %s", e)
         raise
 
 # Configuração do banco de dados SQLite
@@ -61,14 +223,16 @@ def init_db():
             CREATE TABLE IF NOT EXISTS tests (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 uuid TEXT UNIQUE NOT NULL,
-                user_answers TEXT NOT NULL,
+                user_answers BLOB NOT NULL,
                 score INTEGER NOT NULL,
                 level TEXT NOT NULL,
                 correct_answers INTEGER NOT NULL,
                 percentage REAL NOT NULL,
                 payment_id TEXT,
                 payment_status TEXT DEFAULT 'pending',
-                qr_code_data TEXT,
+                qr_code_text TEXT,
+                payment_error TEXT,
+                payment_attempt TEXT,
                 customer_email TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 expires_at TIMESTAMP
@@ -86,58 +250,269 @@ def init_db():
             )
         ''')
 
+        # Colunas adicionadas depois da criação da tabela (bancos antigos guardavam
+        # o PNG em qr_code_data; agora só o código PIX)
+        columns = [row['name'] for row in cursor.execute('PRAGMA table_info(tests)')]
+        for column in ('qr_code_text', 'payment_error', 'payment_attempt'):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE tests ADD COLUMN {column} TEXT')
+
+        # Índices para a limpeza de expirados e para busca de logs por pagamento
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tests_status_expires
+            ON tests(payment_status, expires_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webhook_payment
+            ON webhook_logs(payment_id)
+        ''')
+
         conn.commit()
+
+        # Atualizar estatísticas para o planejador usar os índices
+        cursor.execute('ANALYZE')
+
         conn.close()
-        print("✅ Banco de dados inicializado com sucesso")
+        logger.info("✅ Banco de dados inicializado com sucesso")
     except Exception as e:
-        print(f"❌ Erro ao inicializar banco: {e}")
+        logger.error("❌ Erro ao inicializar banco: %s", e)
         raise
 
+@lru_cache(maxsize=1024)
+def render_qr_png(text):
+    """Gera o PNG do QR Code (em cache por código PIX)"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(text)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format='PNG')
+    return img_buffer.getvalue()
+
 # Inicializar banco
 try:
     init_db()
 except Exception as e:
-    print(f"❌ ERRO CRÍTICO: Falha ao inicializar banco de dados: {e}")
+    logger.error("❌ ERRO CRÍTICO: Falha ao inicializar banco de dados: %s", e)
+
+class ReadPool:
+    """Pool de conexões somente leitura (SQLite: um escritor, vários leitores)"""
+
+    def __init__(self, size):
+        self._size = size
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._pool = queue.Queue(maxsize=size)
+
+    def _open(self):
+        # Conexões são abertas sob demanda até o tamanho do pool
+        with self._lock:
+            if self._opened >= self._size:
+                return None
+            self._opened += 1
+        try:
+            conn = get_db_connection()
+            conn.execute("PRAGMA query_only=1")
+            return conn
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def fill(self):
+        """Abre antecipadamente todas as conexões do pool"""
+        while True:
+            conn = self._open()
+            if conn is None:
+                return
+            self._pool.put(conn)
+
+    @contextmanager
+    def acquire(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open() or self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+# Conexões compartilhadas: leitores em pool e um único escritor serializado pelo lock
+read_pool = ReadPool(READ_POOL_SIZE)
+writer_lock = threading.Lock()
+_writer_conn = None
+
+@contextmanager
+def write_transaction():
+    """Transação na conexão única de escrita (aberta sob demanda)"""
+    global _writer_conn
+    with writer_lock:
+        if _writer_conn is None:
+            _writer_conn = get_db_connection()
+        with _writer_conn:
+            yield _writer_conn
+
+# Abrir as conexões já na inicialização; se falhar, as rotas tentam novamente
+# e o erro aparece no /health
+try:
+    read_pool.fill()
+    with write_transaction():
+        pass
+except Exception as e:
+    logger.error("❌ ERRO CRÍTICO: Falha ao abrir conexões do banco de dados: %s", e)
+
+# Chamadas ao Mercado Pago feitas fora da thread da requisição
+payment_executor = ThreadPoolExecutor(max_workers=PAYMENT_WORKERS)
+
+# Sinal de desligamento para as threads em segundo plano
+_shutdown = threading.Event()
+atexit.register(_shutdown.set)
 
 # Limpeza automática de testes expirados
 def cleanup_expired_tests():
-    while True:
+    while not _shutdown.is_set():
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'DELETE FROM tests WHERE expires_at < ? AND payment_status = "pending"',
-                (datetime.now(),))
-            deleted = cursor.rowcount
+            now = datetime.now()
+            deleted = 0
+
+            # Remover em lotes para não segurar o lock de escrita por muito tempo
+            while True:
+                with write_transaction() as conn:
+                    cursor = conn.execute('''
+                        DELETE FROM tests WHERE rowid IN (
+                            SELECT rowid FROM tests
+                            WHERE payment_status = 'pending' AND expires_at < ?
+                            LIMIT ?
+                        )
+                    ''', (now, CLEANUP_BATCH_SIZE))
+                if cursor.rowcount == 0:
+                    break
+                deleted += cursor.rowcount
+                time.sleep(0.05)
+
             if deleted > 0:
-                print(f"🧹 Limpeza: {deleted} testes expirados removidos")
-            conn.commit()
-            conn.close()
+                logger.info("🧹 Limpeza: %s testes expirados removidos", deleted)
+
+            # Manter o arquivo WAL pequeno após a limpeza
+            with write_transaction() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         except Exception as e:
-            print(f"❌ Erro na limpeza: {e}")
+            logger.error("❌ Erro na limpeza: %s", e)
 
-        # Executar a cada hora
-        time.sleep(3600)
+        # Aguardar o próximo ciclo (interrompido no desligamento)
+        _shutdown.wait(CLEANUP_INTERVAL_SEC)
 
-# Iniciar thread de limpeza
-cleanup_thread = threading.Thread(target=cleanup_expired_tests, daemon=True)
-cleanup_thread.start()
+_cleanup_lock_file = None
 
-@app.route('/')
-def index():
+def acquire_cleanup_lock():
+    """Garante que só um processo (ex.: um worker do gunicorn) execute a limpeza"""
+    global _cleanup_lock_file
+    if fcntl is None:
+        # Sem flock (Windows): servidor local com um único processo
+        return True
     try:
-        # Tentar encontrar o arquivo index.html
-        possible_paths = ['index.html', './index.html', 'templates/index.html']
-        
-        for path in possible_paths:
+        lock_file = open(DB_PATH + '.cleanup.lock', 'w')
+    except OSError as e:
+        logger.error("❌ Erro ao abrir lock da limpeza: %s", e)
+        return False
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Mantido aberto: o lock é liberado quando o processo termina
+    _cleanup_lock_file = lock_file
+    return True
+
+# Iniciar thread de limpeza apenas no processo que obtiver o lock
+# (RUN_CLEANUP=0 desativa a limpeza em todos os processos)
+if os.getenv('RUN_CLEANUP', '1') == '1' and not app.debug and acquire_cleanup_lock():
+    cleanup_thread = threading.Thread(target=cleanup_expired_tests, daemon=True)
+    cleanup_thread.start()
+
+# Logs de webhook gravados em lote por uma thread em segundo plano
+_webhook_log_queue = queue.Queue(maxsize=WEBHOOK_LOG_QUEUE_SIZE)
+
+def enqueue_webhook_log(payment_id, status, data):
+    """Enfileira um log de webhook, descartando o mais antigo se a fila estiver cheia"""
+    while True:
+        try:
+            _webhook_log_queue.put_nowait((payment_id, status, data))
+            return
+        except queue.Full:
             try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            except FileNotFoundError:
-                continue
-        
-        # Se não encontrar o arquivo, retornar uma página simples
-        return """
+                _webhook_log_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+def write_webhook_logs(rows):
+    """Grava um lote de logs de webhook em uma única transação"""
+    with write_transaction() as conn:
+        conn.executemany('''
+            INSERT INTO webhook_logs (payment_id, status, data)
+            VALUES (?, ?, ?)
+        ''', [(payment_id, status, orjson.dumps(data).decode()) for payment_id, status, data in rows])
+
+def webhook_log_writer():
+    while not _shutdown.is_set():
+        try:
+            rows = [_webhook_log_queue.get(timeout=1)]
+        except queue.Empty:
+            continue
+
+        # Juntar o que chegar até completar o lote ou estourar o prazo
+        deadline = time.monotonic() + WEBHOOK_LOG_FLUSH_SEC
+        while len(rows) < WEBHOOK_LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(_webhook_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            write_webhook_logs(rows)
+        except Exception as e:
+            logger.error("❌ Erro ao gravar logs de webhook: %s", e)
+
+def flush_webhook_logs():
+    """Grava os logs ainda na fila (chamado no desligamento)"""
+    rows = []
+    while True:
+        try:
+            rows.append(_webhook_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    if rows:
+        try:
+            write_webhook_logs(rows)
+        except Exception as e:
+            logger.error("❌ Erro ao gravar logs de webhook: %s", e)
+
+atexit.register(flush_webhook_logs)
+
+webhook_log_thread = threading.Thread(target=webhook_log_writer, daemon=True)
+webhook_log_thread.start()
+
+def load_index_html():
+    """Lê o index.html uma única vez na inicialização"""
+    # Tentar encontrar o arquivo index.html
+    possible_paths = ['index.html', './index.html', 'templates/index.html']
+
+    for path in possible_paths:
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.error("❌ Erro ao carregar index.html: %s", e)
+
+    # Se não encontrar o arquivo, usar uma página simples
+    return """
         <!DOCTYPE html>
         <html>
         <head><title>QI Test</title></head>
@@ -147,116 +522,81 @@ def index():
         <a href="/health">Verificar saúde da API</a>
         </body>
         </html>
-        """
-    except Exception as e:
-        print(f"❌ Erro ao carregar index.html: {e}")
-        return jsonify({"error": "Erro ao carregar página"}), 500
+        """.encode('utf-8')
+
+_INDEX_HTML = load_index_html()
+
+@app.route('/')
+def index():
+    return Response(_INDEX_HTML, mimetype='text/html')
 
 @app.route('/submit_test', methods=['POST'])
 def submit_test():
     """Recebe as respostas do teste e calcula a pontuação"""
     try:
-        print("📥 Recebendo dados do teste...")
+        logger.info("📥 Recebendo dados do teste...")
         
         # Verificar se há dados JSON
         if not request.is_json:
-            print("❌ Request não é JSON")
+            logger.warning("❌ Request não é JSON")
             return jsonify({"error": "Content-Type deve ser application/json"}), 400
         
         data = request.get_json()
         if not data:
-            print("❌ Dados JSON vazios")
+            logger.warning("❌ Dados JSON vazios")
             return jsonify({"error": "Dados JSON inválidos ou vazios"}), 400
         
-        print(f"📊 Dados recebidos: {data}")
+        logger.debug("📊 Dados recebidos: %s", data)
         
         user_answers = data.get('answers', [])
         customer_email = data.get('email', 'cliente@qi-test.com.br')
         
-        print(f"📝 Respostas: {len(user_answers)} itens")
-        print(f"📧 Email: {customer_email}")
+        logger.debug("📝 Respostas: %s itens", len(user_answers))
+        logger.debug("📧 Email: %s", customer_email)
         
         # Validação do número de respostas
         if len(user_answers) != 30:
             error_msg = f"Número incorreto de respostas: {len(user_answers)}/30"
-            print(f"❌ {error_msg}")
+            logger.warning("❌ %s", error_msg)
             return jsonify({"error": error_msg}), 400
         
         # Validação dos tipos de dados das respostas
         for i, answer in enumerate(user_answers):
             if not isinstance(answer, int) or answer < 0 or answer > 4:
                 error_msg = f"Resposta inválida na posição {i}: {answer} (deve ser inteiro entre 0-4)"
-                print(f"❌ {error_msg}")
+                logger.warning("❌ %s", error_msg)
                 return jsonify({"error": error_msg}), 400
 
-        # Respostas corretas (as mesmas do frontend)
-        correct_answers_list = [1, 2, 3, 1, 4, 3, 2, 0, 1, 1, 1, 1, 1, 2, 2,
-                                4, 2, 1, 1, 1, 0, 0, 3, 1, 1, 1, 1, 3, 0, 0]
-
         # Calcular pontuação
-        correct_count = 0
-        for i, answer in enumerate(user_answers):
-            if i < len(correct_answers_list) and answer == correct_answers_list[i]:
-                correct_count += 1
+        correct_count = sum(map(operator.eq, user_answers, CORRECT_ANSWERS))
 
         percentage = (correct_count / 30) * 100
-        print(f"🎯 Acertos: {correct_count}/30 ({percentage:.1f}%)")
-
-        # Calcular QI (fórmula refinada para produção)
-        if percentage >= 95:
-            iq_score = int(145 + (percentage - 95) * 2)
-        elif percentage >= 85:
-            iq_score = int(130 + (percentage - 85) * 1.5)
-        elif percentage >= 70:
-            iq_score = int(115 + (percentage - 70) * 1)
-        elif percentage >= 50:
-            iq_score = int(100 + (percentage - 50) * 0.75)
-        elif percentage >= 30:
-            iq_score = int(85 + (percentage - 30) * 0.75)
-        else:
-            iq_score = int(70 + percentage * 0.5)
-
-        # Limitar QI entre 50 e 200
-        iq_score = max(50, min(200, iq_score))
-
-        # Determinar nível
-        if iq_score >= 140:
-            level = "Gênio"
-        elif iq_score >= 130:
-            level = "Superdotado"
-        elif iq_score >= 115:
-            level = "Acima da Média"
-        elif iq_score >= 85:
-            level = "Média"
-        else:
-            level = "Abaixo da Média"
+        logger.info("🎯 Acertos: %s/30 (%.1f%%)", correct_count, percentage)
+
+        # QI e nível pré-calculados por número de acertos
+        iq_score, level = _IQ_TABLE[correct_count]
 
         # Gerar UUID único
         test_uuid = str(uuid.uuid4())
-        print(f"🆔 UUID gerado: {test_uuid}")
+        logger.debug("🆔 UUID gerado: %s", test_uuid)
 
         # Salvar no banco (com melhor tratamento de erro)
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
             expires_at = datetime.now() + timedelta(hours=24)
 
-            cursor.execute('''
-                INSERT INTO tests (uuid, user_answers, score, level,
-                                   correct_answers, percentage, customer_email,
-                                   expires_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (test_uuid, json.dumps(user_answers), iq_score, level,
-                  correct_count, percentage, customer_email, expires_at))
-
-            conn.commit()
-            conn.close()
+            with write_transaction() as conn:
+                conn.execute('''
+                    INSERT INTO tests (uuid, user_answers, score, level,
+                                       correct_answers, percentage, customer_email,
+                                       expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (test_uuid, bytes(user_answers), iq_score, level,
+                      correct_count, percentage, customer_email, expires_at))
             
-            print(f"✅ Teste salvo no banco: {test_uuid} - QI: {iq_score} - Level: {level}")
+            logger.info("✅ Teste salvo no banco: %s - QI: %s - Level: %s", test_uuid, iq_score, level)
 
         except sqlite3.Error as db_error:
-            print(f"❌ Erro do banco de dados: {db_error}")
+            logger.error("❌ Erro do banco de dados: %s", db_error)
             return jsonify({"error": "Erro ao salvar no banco de dados"}), 500
 
         return jsonify({
@@ -269,71 +609,153 @@ def submit_test():
         })
 
     except Exception as e:
-        print(f"❌ Erro inesperado ao processar teste: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Erro inesperado ao processar teste: %s", e)
         return jsonify({"error": f"Erro interno do servidor: {str(e)}"}), 500
 
+# Campos fixos de todo pagamento PIX (os demais são preenchidos por requisição)
+PAYMENT_TEMPLATE = {
+    "transaction_amount": 5.29,
+    "description": "Teste de QI - Resultado Completo - QI Test Pro",
+    "payment_method_id": "pix",
+    "payer": {
+        "first_name": "Cliente",
+        "last_name": "QI"
+    }
+}
+
+@lru_cache(maxsize=32)
+def get_webhook_url(host_url):
+    """Monta a URL do webhook para o host da requisição (em cache por host)"""
+    # URL base para webhook (Render)
+    base_url = os.getenv('BASE_URL', 'https://teste-de-inteligencia.onrender.com')
+    if 'localhost' in host_url or '127.0.0.1' in host_url:
+        base_url = host_url.rstrip('/')
+    return f"{base_url}/webhook/mercadopago"
+
+def save_payment_error(test_uuid, attempt, message, payment_id=None):
+    """Registra a falha na criação do pagamento para o frontend exibir"""
+    try:
+        with write_transaction() as conn:
+            conn.execute('''
+                UPDATE tests
+                SET payment_error = ?, payment_id = COALESCE(?, payment_id)
+                WHERE uuid = ? AND payment_attempt = ?
+            ''', (message, payment_id, test_uuid, attempt))
+    except sqlite3.Error as db_error:
+        logger.error("❌ Erro ao salvar dados do pagamento: %s", db_error)
+
+def create_mp_payment(test_uuid, attempt, payment_data):
+    """Cria o pagamento no Mercado Pago e salva o código PIX (executado no payment_executor)"""
+    # Os UPDATEs só valem se `attempt` ainda for a tentativa mais recente do teste,
+    # para que uma chamada antiga mais lenta não sobrescreva o pagamento de uma nova
+    try:
+        try:
+            payment_response = sdk.payment().create(payment_data)
+            logger.debug("📤 Resposta do Mercado Pago: %s", payment_response)
+
+        except Exception as mp_error:
+            logger.error("❌ Erro na API do Mercado Pago: %s", mp_error)
+            save_payment_error(test_uuid, attempt, f"Erro na API do Mercado Pago: {str(mp_error)}")
+            return
+
+        if payment_response["status"] != 201:
+            logger.error("❌ Erro MP - Status: %s - Detalhes: %s",
+                         payment_response['status'], payment_response.get("response", {}))
+            save_payment_error(test_uuid, attempt, "Erro ao criar pagamento")
+            return
+
+        payment = payment_response["response"]
+        payment_id = payment["id"]
+        logger.info("✅ Pagamento criado - ID: %s", payment_id)
+
+        # Obter dados do PIX
+        qr_code_text = dig(payment, "point_of_interaction", "transaction_data", "qr_code", default="")
+
+        logger.debug("🏦 PIX - Tem QR Code: %s", bool(qr_code_text))
+
+        if not qr_code_text:
+            # O pagamento existe no Mercado Pago; guardar o ID mesmo sem QR Code
+            save_payment_error(test_uuid, attempt, "Pagamento criado, mas QR Code não disponível",
+                                        payment_id=payment_id)
+            return
+
+        # Pré-gerar o PNG para o /qr/<uuid>.png responder do cache
+        try:
+            render_qr_png(qr_code_text)
+        except Exception as qr_error:
+            logger.error("❌ Erro ao gerar QR Code: %s", qr_error)
+
+        # Atualizar teste com dados do pagamento
+        try:
+            with write_transaction() as conn:
+                cursor = conn.execute('''
+                    UPDATE tests
+                    SET payment_id = ?, qr_code_text = ?
+                    WHERE uuid = ? AND payment_attempt = ?
+                ''', (payment_id, qr_code_text, test_uuid, attempt))
+
+            if cursor.rowcount > 0:
+                logger.info("✅ Dados do pagamento salvos no banco")
+            else:
+                logger.warning("⚠️  Pagamento %s ignorado: há uma tentativa mais recente para o teste %s",
+                               payment_id, test_uuid)
+
+        except sqlite3.Error as db_error:
+            logger.error("❌ Erro ao salvar dados do pagamento: %s", db_error)
+
+    except Exception as e:
+        logger.exception("❌ Erro inesperado ao criar pagamento: %s", e)
+        save_payment_error(test_uuid, attempt, f"Erro interno: {str(e)}")
+
 @app.route('/create_payment', methods=['POST'])
 def create_payment():
     """Cria um pagamento PIX via Mercado Pago - PRODUÇÃO"""
     try:
-        print("💳 Iniciando criação de pagamento...")
+        logger.info("💳 Iniciando criação de pagamento...")
         
         data = request.get_json()
         if not data:
             return jsonify({"error": "Dados JSON inválidos"}), 400
             
         test_uuid = data.get('test_uuid')
-        print(f"🆔 Test UUID: {test_uuid}")
+        logger.debug("🆔 Test UUID: %s", test_uuid)
 
         if not test_uuid:
             return jsonify({"error": "test_uuid é obrigatório"}), 400
 
         # Verificar se o teste existe
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM tests WHERE uuid = ?', (test_uuid,))
-            test_data = cursor.fetchone()
+            with read_pool.acquire() as conn:
+                cursor = conn.execute('SELECT customer_email FROM tests WHERE uuid = ?', (test_uuid,))
+                test_data = cursor.fetchone()
 
             if not test_data:
-                conn.close()
-                print(f"❌ Teste não encontrado: {test_uuid}")
+                logger.warning("❌ Teste não encontrado: %s", test_uuid)
                 return jsonify({"error": "Teste não encontrado"}), 404
                 
-            print(f"✅ Teste encontrado no banco")
+            logger.info("✅ Teste encontrado no banco")
 
         except sqlite3.Error as db_error:
-            print(f"❌ Erro ao buscar teste: {db_error}")
+            logger.error("❌ Erro ao buscar teste: %s", db_error)
             return jsonify({"error": "Erro ao acessar banco de dados"}), 500
 
-        # URL base para webhook (Render)
-        base_url = os.getenv('BASE_URL', 'https://teste-de-inteligencia.onrender.com')
-        if 'localhost' in request.host_url or '127.0.0.1' in request.host_url:
-            base_url = request.host_url.rstrip('/')
-
-        print(f"🔗 Base URL: {base_url}")
+        webhook_url = get_webhook_url(request.host_url)
 
         # CORREÇÃO: Data de expiração com timezone correto
         expiration_date = datetime.now(timezone.utc) + timedelta(hours=2)
         # Formato correto para o Mercado Pago: yyyy-MM-dd'T'HH:mm:ss.sssZ
         expiration_formatted = expiration_date.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
         
-        print(f"📅 Data de expiração formatada: {expiration_formatted}")
+        logger.debug("📅 Data de expiração formatada: %s", expiration_formatted)
 
         # Criar pagamento no Mercado Pago (PRODUÇÃO)
-        payment_data = {
-            "transaction_amount": 5.29,
-            "description": "Teste de QI - Resultado Completo - QI Test Pro",
-            "payment_method_id": "pix",
+        payment_data = PAYMENT_TEMPLATE | {
             "payer": {
-                "email": test_data[10] if test_data[10] else "cliente@qi-test.com.br",
-                "first_name": "Cliente",
-                "last_name": "QI"
+                **PAYMENT_TEMPLATE["payer"],
+                "email": test_data['customer_email'] if test_data['customer_email'] else "cliente@qi-test.com.br"
             },
             "external_reference": test_uuid,
-            "notification_url": f"{base_url}/webhook/mercadopago",
+            "notification_url": webhook_url,
             "date_of_expiration": expiration_formatted,  # ← CORRIGIDO
             "metadata": {
                 "test_uuid": test_uuid,
@@ -341,102 +763,55 @@ def create_payment():
             }
         }
 
-        print(f"💳 Dados do pagamento: {payment_data}")
-        print(f"🔗 Webhook URL: {base_url}/webhook/mercadopago")
+        logger.debug("💳 Dados do pagamento: %s", payment_data)
+        logger.debug("🔗 Webhook URL: %s", webhook_url)
 
+        # Limpar dados de uma tentativa anterior e marcar esta como a mais recente
+        attempt = uuid.uuid4().hex
         try:
-            payment_response = sdk.payment().create(payment_data)
-            print(f"📤 Resposta do Mercado Pago: {payment_response}")
-
-        except Exception as mp_error:
-            print(f"❌ Erro na API do Mercado Pago: {mp_error}")
-            conn.close()
-            return jsonify({"error": f"Erro na API do Mercado Pago: {str(mp_error)}"}), 500
-
-        if payment_response["status"] != 201:
-            conn.close()
-            print(f"❌ Erro MP - Status: {payment_response['status']}")
-            return jsonify({
-                "error": "Erro ao criar pagamento",
-                "details": payment_response.get("response", {}),
-                "status": payment_response.get("status")
-            }), 500
-
-        payment = payment_response["response"]
-        payment_id = payment["id"]
-        print(f"✅ Pagamento criado - ID: {payment_id}")
-
-        # Obter dados do PIX
-        pix_data = payment.get("point_of_interaction", {}).get("transaction_data", {})
-        qr_code_text = pix_data.get("qr_code", "")
-        qr_code_base64 = pix_data.get("qr_code_base64", "")
-
-        print(f"🏦 PIX - Tem QR Code: {bool(qr_code_text)}, Tem Base64: {bool(qr_code_base64)}")
-
-        # Se não tiver QR code base64, gerar um
-        if not qr_code_base64 and qr_code_text:
-            try:
-                qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                qr.add_data(qr_code_text)
-                qr.make(fit=True)
-
-                img = qr.make_image(fill_color="black", back_color="white")
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format='PNG')
-                qr_code_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-                print("✅ QR Code gerado localmente")
-            except Exception as qr_error:
-                print(f"❌ Erro ao gerar QR Code: {qr_error}")
-
-        # Atualizar teste com dados do pagamento
-        try:
-            cursor.execute('''
-                UPDATE tests
-                SET payment_id = ?, qr_code_data = ?
-                WHERE uuid = ?
-            ''', (payment_id, qr_code_base64, test_uuid))
-
-            conn.commit()
-            conn.close()
-            print("✅ Dados do pagamento salvos no banco")
+            with write_transaction() as conn:
+                conn.execute('''
+                    UPDATE tests
+                    SET qr_code_text = NULL, payment_error = NULL, payment_attempt = ?
+                    WHERE uuid = ?
+                ''', (attempt, test_uuid))
 
         except sqlite3.Error as db_error:
-            print(f"❌ Erro ao salvar dados do pagamento: {db_error}")
-            conn.close()
+            logger.error("❌ Erro ao salvar dados do pagamento: %s", db_error)
             return jsonify({"error": "Erro ao salvar dados do pagamento"}), 500
 
+        # O pagamento é criado em segundo plano; o frontend acompanha via /check_payment
+        payment_executor.submit(create_mp_payment, test_uuid, attempt, payment_data)
+
         return jsonify({
             'success': True,
-            'payment_id': payment_id,
-            'qr_code_base64': qr_code_base64,
-            'qr_code_text': qr_code_text,
+            'status': 'pending',
+            'test_uuid': test_uuid,
             'expiration_time': 7200  # 2 horas em segundos
-        })
+        }), 202
 
     except Exception as e:
-        print(f"❌ Erro inesperado ao criar pagamento: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Erro inesperado ao criar pagamento: %s", e)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 @app.route('/debug/payment', methods=['POST'])
 def debug_payment():
     """Endpoint temporário para debug do Mercado Pago"""
     try:
-        print("🔧 DEBUG: Testando configurações do Mercado Pago")
+        logger.info("🔧 DEBUG: Testando configurações do Mercado Pago")
         
         # Verificar token
-        print(f"🔑 Token configurado: {bool(MP_ACCESS_TOKEN)}")
-        print(f"🔑 Tipo do token: {'PROD' if not MP_ACCESS_TOKEN.startswith('TEST-') else 'TEST'}")
-        print(f"🔑 Primeiros chars: {MP_ACCESS_TOKEN[:20]}...")
+        logger.debug("🔑 Token configurado: %s", bool(MP_ACCESS_TOKEN))
+        logger.debug("🔑 Tipo do token: %s", 'PROD' if not MP_ACCESS_TOKEN.startswith('TEST-') else 'TEST')
+        logger.debug("🔑 Primeiros chars: %s...", MP_ACCESS_TOKEN[:20])
         
         # Testar conexão com MP
         try:
             # Teste simples - listar métodos de pagamento
             payment_methods = sdk.payment_methods().list_all()
-            print(f"✅ Conexão com MP OK - Status: {payment_methods['status']}")
+            logger.info("✅ Conexão com MP OK - Status: %s", payment_methods['status'])
         except Exception as mp_test_error:
-            print(f"❌ Erro na conexão com MP: {mp_test_error}")
+            logger.error("❌ Erro na conexão com MP: %s", mp_test_error)
             return jsonify({
                 "error": "Erro na conexão com Mercado Pago",
                 "details": str(mp_test_error)
@@ -453,9 +828,9 @@ def debug_payment():
                 }
             }
             
-            print(f"🧪 Testando criação de pagamento...")
+            logger.info("🧪 Testando criação de pagamento...")
             test_response = sdk.payment().create(test_payment_data)
-            print(f"🧪 Resposta do teste: {test_response}")
+            logger.debug("🧪 Resposta do teste: %s", test_response)
             
             return jsonify({
                 "status": "success",
@@ -466,7 +841,7 @@ def debug_payment():
             })
             
         except Exception as payment_error:
-            print(f"❌ Erro no teste de pagamento: {payment_error}")
+            logger.error("❌ Erro no teste de pagamento: %s", payment_error)
             return jsonify({
                 "status": "partial_success", 
                 "token_ok": True,
@@ -476,9 +851,7 @@ def debug_payment():
             })
             
     except Exception as e:
-        print(f"❌ Erro geral no debug: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Erro geral no debug: %s", e)
         return jsonify({
             "status": "error",
             "error": str(e)
@@ -489,162 +862,193 @@ def mercadopago_webhook():
     """Webhook para receber notificações do Mercado Pago - PRODUÇÃO"""
     try:
         data = request.get_json()
-        print(f"🔔 Webhook recebido: {data}")
+        logger.debug("🔔 Webhook recebido: %s", data)
 
         if not data:
-            print("❌ Webhook sem dados")
+            logger.warning("❌ Webhook sem dados")
             return jsonify({"status": "ok"}), 200
 
-        # Log do webhook
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            payment_id = None
-            if data.get('data', {}).get('id'):
-                payment_id = data.get('data', {}).get('id')
-
-            cursor.execute('''
-                INSERT INTO webhook_logs (payment_id, status, data)
-                VALUES (?, ?, ?)
-            ''', (payment_id, data.get('action', ''), json.dumps(data)))
-
-            # Verificar se é uma notificação de pagamento
-            if (data.get('action') == 'payment.updated' or data.get('type') == 'payment'):
-                payment_id = data.get('data', {}).get('id')
-
-                if payment_id:
-                    print(f"💳 Verificando pagamento ID: {payment_id}")
+        payment_id = dig(data, 'data', 'id') or None
+        external_reference = None
+        new_status = None
 
-                    try:
-                        # Buscar detalhes do pagamento
-                        payment_info = sdk.payment().get(payment_id)
+        # Verificar se é uma notificação de pagamento (consulta ao MP fora do lock de escrita)
+        if (data.get('action') == 'payment.updated' or data.get('type') == 'payment') and payment_id:
+            logger.info("💳 Verificando pagamento ID: %s", payment_id)
 
-                        if payment_info["status"] == 200:
-                            payment = payment_info["response"]
-                            external_reference = payment.get("external_reference")
-                            payment_status = payment.get("status")
-
-                            print(f"💰 Payment ID: {payment_id}, Status: {payment_status}, Reference: {external_reference}")
+            try:
+                # Buscar detalhes do pagamento
+                payment_info = sdk.payment().get(payment_id)
 
-                            if external_reference and payment_status in ['approved', 'authorized']:
-                                # Atualizar status do teste
-                                cursor.execute('''
-                                    UPDATE tests
-                                    SET payment_status = 'approved'
-                                    WHERE uuid = ?
-                                ''', (external_reference,))
+                if payment_info["status"] == 200:
+                    payment = payment_info["response"]
+                    external_reference = payment.get("external_reference")
+                    payment_status = payment.get("status")
 
-                                if cursor.rowcount > 0:
-                                    print(f"✅ PAGAMENTO APROVADO para teste: {external_reference}")
-                                else:
-                                    print(f"⚠️  Teste não encontrado para UUID: {external_reference}")
+                    logger.debug("💰 Payment ID: %s, Status: %s, Reference: %s", payment_id, payment_status, external_reference)
 
-                            elif external_reference and payment_status in ['rejected', 'cancelled']:
-                                cursor.execute('''
-                                    UPDATE tests
-                                    SET payment_status = 'rejected'
-                                    WHERE uuid = ?
-                                ''', (external_reference,))
-                                print(f"❌ Pagamento rejeitado para teste: {external_reference}")
+                    if external_reference and payment_status in ['approved', 'authorized']:
+                        new_status = 'approved'
+                    elif external_reference and payment_status in ['rejected', 'cancelled']:
+                        new_status = 'rejected'
 
-                    except Exception as mp_error:
-                        print(f"❌ Erro ao buscar detalhes do pagamento: {mp_error}")
+            except Exception as mp_error:
+                logger.error("❌ Erro ao buscar detalhes do pagamento: %s", mp_error)
 
-            conn.commit()
-            conn.close()
+        # Log do webhook (gravado em lote pela thread de logs)
+        enqueue_webhook_log(payment_id, data.get('action', ''), data)
 
-        except sqlite3.Error as db_error:
-            print(f"❌ Erro de banco no webhook: {db_error}")
+        # Atualizar status do teste
+        if new_status:
+            try:
+                with write_transaction() as conn:
+                    cursor = conn.execute('''
+                        UPDATE tests
+                        SET payment_status = ?
+                        WHERE uuid = ?
+                    ''', (new_status, external_reference))
+
+                if new_status == 'rejected':
+                    logger.warning("❌ Pagamento rejeitado para teste: %s", external_reference)
+                elif cursor.rowcount > 0:
+                    logger.info("✅ PAGAMENTO APROVADO para teste: %s", external_reference)
+                else:
+                    logger.warning("⚠️  Teste não encontrado para UUID: %s", external_reference)
+
+            except sqlite3.Error as db_error:
+                logger.error("❌ Erro de banco no webhook: %s", db_error)
 
         return jsonify({"status": "ok"}), 200
 
     except Exception as e:
-        print(f"❌ Erro no webhook: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Erro no webhook: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/check_payment/<test_uuid>', methods=['GET'])
 def check_payment(test_uuid):
     """Verifica o status do pagamento para um teste"""
     try:
-        print(f"🔍 Verificando pagamento para UUID: {test_uuid}")
+        logger.debug("🔍 Verificando pagamento para UUID: %s", test_uuid)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM tests WHERE uuid = ?', (test_uuid,))
-        test_data = cursor.fetchone()
-        conn.close()
+        with read_pool.acquire() as conn:
+            cursor = conn.execute('''
+                SELECT uuid, score, level, correct_answers, percentage,
+                       payment_status, user_answers, qr_code_text, payment_error
+                FROM tests WHERE uuid = ?
+            ''', (test_uuid,))
+            test_data = cursor.fetchone()
 
         if not test_data:
-            print(f"❌ Teste não encontrado: {test_uuid}")
+            logger.warning("❌ Teste não encontrado: %s", test_uuid)
             return jsonify({"error": "Teste não encontrado"}), 404
 
-        # Mapear colunas
-        columns = ['id', 'uuid', 'user_answers', 'score', 'level',
-                   'correct_answers', 'percentage', 'payment_id',
-                   'payment_status', 'qr_code_data', 'customer_email',
-                   'created_at', 'expires_at']
-        test_dict = dict(zip(columns, test_data))
+        (uuid_, score, level, correct_answers, percentage,
+         payment_status, user_answers, qr_code_text, payment_error) = test_data
 
-        print(f"💰 Status do pagamento: {test_dict['payment_status']}")
+        logger.debug("💰 Status do pagamento: %s", payment_status)
 
         return jsonify({
-            'test_uuid': test_dict['uuid'],
-            'payment_status': test_dict['payment_status'],
-            'score': test_dict['score'],
-            'level': test_dict['level'],
-            'correct_answers': test_dict['correct_answers'],
-            'percentage': test_dict['percentage'],
-            'user_answers': json.loads(test_dict['user_answers']) if test_dict['user_answers'] else []
+            'test_uuid': uuid_,
+            'payment_status': payment_status,
+            'score': score,
+            'level': level,
+            'correct_answers': correct_answers,
+            'percentage': percentage,
+            'user_answers': decode_answers(user_answers),
+            'qr_code_text': qr_code_text,
+            'payment_error': payment_error
         })
 
     except Exception as e:
-        print(f"❌ Erro ao verificar pagamento: {e}")
+        logger.error("❌ Erro ao verificar pagamento: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/batch', methods=['POST'])
+def batch_check_payment():
+    """Retorna o status do pagamento de vários testes em uma única consulta"""
+    try:
+        data = request.get_json(silent=True)
+        uuids = data.get('uuids') if isinstance(data, dict) else None
+
+        if not isinstance(uuids, list) or not all(isinstance(u, str) for u in uuids):
+            return jsonify({"error": "uuids deve ser uma lista de strings"}), 400
+
+        uuids = list(dict.fromkeys(uuids))
+        if len(uuids) > BATCH_MAX_UUIDS:
+            return jsonify({"error": f"Máximo de {BATCH_MAX_UUIDS} uuids por requisição"}), 400
+
+        statuses = dict.fromkeys(uuids)
+        if uuids:
+            placeholders = ', '.join('?' * len(uuids))
+            with read_pool.acquire() as conn:
+                cursor = conn.execute(
+                    f'SELECT uuid, payment_status FROM tests WHERE uuid IN ({placeholders})',
+                    uuids)
+                for row in cursor:
+                    statuses[row['uuid']] = row['payment_status']
+
+        return jsonify({"statuses": statuses})
+
+    except Exception as e:
+        logger.error("❌ Erro ao verificar pagamentos em lote: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/get_result/<test_uuid>', methods=['GET'])
 def get_result(test_uuid):
     """Retorna o resultado completo se o pagamento foi aprovado"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM tests WHERE uuid = ?', (test_uuid,))
-        test_data = cursor.fetchone()
-        conn.close()
+        with read_pool.acquire() as conn:
+            cursor = conn.execute('''
+                SELECT uuid, score, level, correct_answers, percentage,
+                       payment_status, user_answers
+                FROM tests WHERE uuid = ?
+            ''', (test_uuid,))
+            test_data = cursor.fetchone()
 
         if not test_data:
             return jsonify({"error": "Teste não encontrado"}), 404
 
-        # Mapear colunas
-        columns = ['id', 'uuid', 'user_answers', 'score', 'level',
-                   'correct_answers', 'percentage', 'payment_id',
-                   'payment_status', 'qr_code_data', 'customer_email',
-                   'created_at', 'expires_at']
-        test_dict = dict(zip(columns, test_data))
+        (uuid_, score, level, correct_answers, percentage,
+         payment_status, user_answers) = test_data
 
-        if test_dict['payment_status'] != 'approved':
+        if payment_status != 'approved':
             return jsonify({
                 "error": "Pagamento não aprovado",
-                "payment_status": test_dict['payment_status']
+                "payment_status": payment_status
             }), 403
 
-        print(f"✅ Resultado liberado para teste: {test_uuid}")
+        logger.info("✅ Resultado liberado para teste: %s", test_uuid)
 
         return jsonify({
             'success': True,
-            'test_uuid': test_dict['uuid'],
-            'score': test_dict['score'],
-            'level': test_dict['level'],
-            'correct_answers': test_dict['correct_answers'],
-            'percentage': test_dict['percentage'],
-            'user_answers': json.loads(test_dict['user_answers']) if test_dict['user_answers'] else [],
-            'payment_status': test_dict['payment_status']
+            'test_uuid': uuid_,
+            'score': score,
+            'level': level,
+            'correct_answers': correct_answers,
+            'percentage': percentage,
+            'user_answers': decode_answers(user_answers),
+            'payment_status': payment_status
         })
 
     except Exception as e:
-        print(f"❌ Erro ao obter resultado: {e}")
+        logger.error("❌ Erro ao obter resultado: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/qr/<test_uuid>.png', methods=['GET'])
+def qr_code_image(test_uuid):
+    """Retorna o QR Code PIX do teste, gerado sob demanda a partir do código salvo"""
+    try:
+        with read_pool.acquire() as conn:
+            cursor = conn.execute('SELECT qr_code_text FROM tests WHERE uuid = ?', (test_uuid,))
+            test_data = cursor.fetchone()
+
+        if not test_data or not test_data['qr_code_text']:
+            return jsonify({"error": "QR Code não encontrado"}), 404
+
+        return Response(render_qr_png(test_data['qr_code_text']), mimetype='image/png')
+
+    except Exception as e:
+        logger.error("❌ Erro ao gerar QR Code: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/health', methods=['GET'])
@@ -652,14 +1056,11 @@ def health():
     """Endpoint de saúde da aplicação"""
     try:
         # Testar conexão com banco
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM tests')
-        test_count = cursor.fetchone()[0]
-        conn.close()
+        with read_pool.acquire() as conn:
+            test_count = conn.execute('SELECT COUNT(*) FROM tests').fetchone()[0]
         db_status = "ok"
     except Exception as e:
-        print(f"❌ Erro no health check do banco: {e}")
+        logger.error("❌ Erro no health check do banco: %s", e)
         db_status = f"error: {str(e)}"
         test_count = -1
 
@@ -683,22 +1084,20 @@ def health():
 def stats():
     """Estatísticas básicas do sistema"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Total de testes
-        cursor.execute('SELECT COUNT(*) FROM tests')
-        total_tests = cursor.fetchone()[0]
+        with read_pool.acquire() as conn:
+            cursor = conn.cursor()
 
-        # Testes pagos
-        cursor.execute('SELECT COUNT(*) FROM tests WHERE payment_status = "approved"')
-        paid_tests = cursor.fetchone()[0]
+            # Total de testes
+            cursor.execute('SELECT COUNT(*) FROM tests')
+            total_tests = cursor.fetchone()[0]
 
-        # Média de QI
-        cursor.execute('SELECT AVG(score) FROM tests WHERE payment_status = "approved"')
-        avg_qi = cursor.fetchone()[0] or 0
+            # Testes pagos
+            cursor.execute('SELECT COUNT(*) FROM tests WHERE payment_status = "approved"')
+            paid_tests = cursor.fetchone()[0]
 
-        conn.close()
+            # Média de QI
+            cursor.execute('SELECT AVG(score) FROM tests WHERE payment_status = "approved"')
+            avg_qi = cursor.fetchone()[0] or 0
 
         return jsonify({
             "total_tests": total_tests,
@@ -713,10 +1112,10 @@ if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
 
-    print("🚀 Servidor Flask PRODUÇÃO iniciado!")
-    print(f"🔗 Porta: {port}")
-    print(f"🔐 Debug: {debug}")
-    print(f"🗄️  Database Path: {DB_PATH}")
-    print("💳 Usando Mercado Pago PRODUÇÃO")
+    logger.info("🚀 Servidor Flask PRODUÇÃO iniciado!")
+    logger.info("🔗 Porta: %s", port)
+    logger.info("🔐 Debug: %s", debug)
+    logger.info("🗄️  Database Path: %s", DB_PATH)
+    logger.info("💳 Usando Mercado Pago PRODUÇÃO")
 
     app.run(debug=debug, host='0.0.0.0', port=port)